@@ -1,15 +1,24 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import event, select, make_url, URL, func, and_, Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, raiseload
+from sqlalchemy.pool import StaticPool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 import os
+import json
+import time
 from dotenv import load_dotenv
 import yfinance as yf
+import redis
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
 
@@ -18,10 +27,95 @@ load_dotenv()
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cleartrack.db")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str) -> Tuple[URL, dict]:
+    """Point a database URL at its asyncio driver, returning any connect args the driver needs"""
+    url = make_url(url)
+    connect_args = {}
+    if url.get_backend_name() in ("postgres", "postgresql"):
+        # asyncpg takes libpq's sslmode as its ssl argument and has no channel_binding option
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode is not None:
+            connect_args["ssl"] = sslmode
+        query.pop("channel_binding", None)
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, connect_args
+
+ASYNC_DATABASE_URL, DATABASE_CONNECT_ARGS = async_database_url(DATABASE_URL)
+
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite rejects QueuePool sizing options. File databases keep the dialect's default
+    # pool so each session gets its own connection; an in-memory database only exists on
+    # a single connection, so that case alone shares one
+    sqlite_pool = {"poolclass": StaticPool} if ":memory:" in DATABASE_URL or DATABASE_URL == "sqlite://" else {}
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **sqlite_pool
+    )
+    
+    # WAL lets readers run alongside the snapshot writer; NORMAL skips an fsync per commit
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.close()
+else:
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args=DATABASE_CONNECT_ARGS,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=3600
+    )
+
+# Sync session class behind each AsyncSession; ORM event hooks attach here
+SyncSession = sessionmaker()
+SessionLocal = async_sessionmaker(
+    engine,
+    sync_session_class=SyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# One session per request, keyed on a context variable the request middleware sets
+request_scope: ContextVar[Optional[object]] = ContextVar("request_scope", default=None)
+ScopedSession = async_scoped_session(SessionLocal, scopefunc=request_scope.get)
 Base = declarative_base()
 
+# Cache setup
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_TIMEOUT = 0.5  # seconds; an unreachable cache must not stall requests
+redis_client = redis.Redis.from_url(
+    REDIS_URL,
+    socket_connect_timeout=REDIS_TIMEOUT,
+    socket_timeout=REDIS_TIMEOUT
+) if REDIS_URL else None
+MARKET_TZ = ZoneInfo("America/New_York")
+PRICE_CACHE_TTL_OPEN = 60  # 1 minute while the market is open
+PRICE_CACHE_TTL_CLOSED = 24 * 60 * 60  # upper bound after close; also capped at the next open
+PRICE_FETCH_WORKERS = 16
+PORTFOLIO_HISTORY_CACHE_KEY = "portfolio_history"
+PORTFOLIO_HISTORY_CACHE_TTL = 60 * 60  # 1 hour
+HOLDING_VALUES_KEY = "holding_values"
+HOLDING_COSTS_KEY = "holding_costs"
+HOLDING_TOTALS_GENERATION_KEY = "holding_totals:generation"
+SNAPSHOT_PRICE_TOLERANCE = 1e-4
+
+# Development guard: raise on any relationship access that was not eagerly loaded
+if os.getenv("SQL_RAISELOAD", "").lower() in ("1", "true"):
+    @event.listens_for(SyncSession, "do_orm_execute")
+    def apply_raiseload(orm_execute_state):
+        if orm_execute_state.is_select:
+            orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
 # Database Models
 class Holding(Base):
     __tablename__ = "holdings"
@@ -40,22 +134,23 @@ class PriceSnapshot(Base):
     id = Column(Integer, primary_key=True, index=True)
     holding_id = Column(Integer, ForeignKey("holdings.id"))
     price = Column(Float)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, default=datetime.utcnow, index=True)
     
     holding = relationship("Holding", back_populates="snapshots")
+    
+    __table_args__ = (
+        Index("ix_price_snapshots_holding_id_date", "holding_id", "date"),
+    )
 
 class PortfolioHistory(Base):
     __tablename__ = "portfolio_history"
     
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, default=datetime.utcnow, index=True)
     total_value = Column(Float)
     total_invested = Column(Float)
     profit_loss = Column(Float)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Pydantic models
 class HoldingCreate(BaseModel):
     ticker: str
@@ -98,63 +193,334 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
+# Create tables
+def create_schema(connection):
+    Base.metadata.create_all(bind=connection)
+    # create_all skips existing tables, so add any indexes they are missing
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+@app.on_event("startup")
+async def create_tables():
+    async with engine.begin() as connection:
+        await connection.run_sync(create_schema)
+
+@app.on_event("shutdown")
+async def dispose_engine():
+    await engine.dispose()
+
+# Request-scoped database session
+@app.middleware("http")
+async def db_session(request: Request, call_next):
+    token = request_scope.set(object())
     try:
-        yield db
+        return await call_next(request)
     finally:
-        db.close()
+        await ScopedSession.remove()
+        request_scope.reset(token)
 
 # Helper functions
 def get_current_price(ticker: str) -> float:
     """Fetch current stock price using yfinance"""
+    return get_current_prices([ticker]).get(ticker, 0.0)
+
+def get_current_prices(tickers: List[str]) -> Dict[str, float]:
+    """Fetch current prices for several tickers, consulting the caches first"""
+    tickers = tuple(sorted(set(tickers)))
+    if not tickers:
+        return {}
+    try:
+        return dict(cached_prices(tickers, int(time.time() // 60)))
+    except PriceLookupFailed as failure:
+        return failure.prices
+
+class PriceLookupFailed(Exception):
+    """Carries a partial result out of cached_prices so lru_cache does not memoize it"""
+    def __init__(self, prices: Dict[str, float]):
+        super().__init__("price lookup failed for some tickers")
+        self.prices = prices
+
+@lru_cache(maxsize=512)
+def cached_prices(tickers: Tuple[str, ...], bucket: int) -> Dict[str, float]:
+    """Process-local cache keyed on the minute bucket, so entries expire every minute.
+    Results with a failed (0.0) price are raised rather than returned, so they are retried."""
+    tickers = list(tickers)
+    prices = get_cached_prices(tickers)
+    missing = [ticker for ticker in tickers if ticker not in prices]
+    if len(missing) == 1:
+        # One ticker skips the batch download's thread pool and multi-index frame
+        fetched = {missing[0]: fetch_price(missing[0])}
+        cache_prices(fetched)
+        prices.update(fetched)
+    elif missing:
+        fetched = download_prices(missing)
+        failed = [ticker for ticker in missing if not fetched[ticker]]
+        if failed:
+            fetched.update(fetch_prices_concurrently(failed))
+        cache_prices(fetched)
+        prices.update(fetched)
+    if not all(prices.values()):
+        raise PriceLookupFailed(prices)
+    return prices
+
+def download_prices(tickers: List[str]) -> Dict[str, float]:
+    """Fetch current prices for several tickers with a single yfinance download"""
+    prices = {ticker: 0.0 for ticker in tickers}
+    try:
+        data = yf.download(
+            tickers=tickers,
+            period="1d",
+            group_by="ticker",
+            threads=True,
+            progress=False
+        )
+        for ticker in tickers:
+            # Older yfinance releases return flat columns for a single ticker
+            if data.columns.nlevels == 1:
+                frame = data
+            elif ticker in data.columns.get_level_values(0):
+                frame = data[ticker]
+            else:
+                continue
+            closes = frame['Close'].dropna()
+            if not closes.empty:
+                prices[ticker] = float(closes.iloc[-1])
+    except Exception:
+        pass
+    return prices
+
+def fetch_price(ticker: str) -> float:
+    """Fetch a single stock price from the ticker's one-day history"""
     try:
-        stock = yf.Ticker(ticker)
-        data = stock.history(period="1d")
+        data = yf.Ticker(ticker).history(period="1d")
         if not data.empty:
             return float(data['Close'].iloc[-1])
         return 0.0
     except Exception:
         return 0.0
 
+def fetch_prices_concurrently(tickers: List[str]) -> Dict[str, float]:
+    """Fall back to per-ticker requests, run in parallel, when the batch download misses"""
+    with ThreadPoolExecutor(max_workers=min(PRICE_FETCH_WORKERS, len(tickers))) as executor:
+        return dict(zip(tickers, executor.map(fetch_price, tickers)))
+
+def price_cache_ttl() -> int:
+    """Seconds a cached price stays fresh: short while the market is open, until the next open otherwise"""
+    now = datetime.now(MARKET_TZ)
+    market_open = now.replace(hour=9, minute=30, second=0, microsecond=0)
+    market_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
+    if now.weekday() < 5 and market_open <= now < market_close:
+        return PRICE_CACHE_TTL_OPEN
+    
+    next_open = market_open if now < market_open else market_open + timedelta(days=1)
+    while next_open.weekday() >= 5:
+        next_open += timedelta(days=1)
+    # Compare timestamps so a DST change before the next open is accounted for
+    seconds_to_open = int(next_open.timestamp() - now.timestamp())
+    return max(1, min(PRICE_CACHE_TTL_CLOSED, seconds_to_open))
+
+def get_cached_prices(tickers: List[str]) -> Dict[str, float]:
+    """Look up cached prices in Redis, skipping the cache if it is unavailable"""
+    if redis_client is None:
+        return {}
+    try:
+        values = redis_client.mget([f"price:{ticker}" for ticker in tickers])
+        prices = {
+            ticker: float(value)
+            for ticker, value in zip(tickers, values)
+            if value is not None
+        }
+        if prices:
+            redis_client.incrby("cache:hits", len(prices))
+        if len(prices) < len(tickers):
+            redis_client.incrby("cache:misses", len(tickers) - len(prices))
+        return prices
+    except Exception:
+        return {}
+
+def cache_prices(prices: Dict[str, float]):
+    """Store fetched prices in Redis; failed lookups (0.0) are not cached"""
+    if redis_client is None:
+        return
+    try:
+        ttl = price_cache_ttl()
+        pipe = redis_client.pipeline()
+        for ticker, price in prices.items():
+            if price:
+                pipe.setex(f"price:{ticker}", ttl, price)
+        pipe.execute()
+    except Exception:
+        pass
+
+def get_cached_json(key: str):
+    """Read a cached JSON payload from Redis, or None on a miss or cache error"""
+    if redis_client is None:
+        return None
+    try:
+        value = redis_client.get(key)
+        return json.loads(value) if value is not None else None
+    except Exception:
+        return None
+
+def cache_json(key: str, payload, ttl: int):
+    """Store a JSON payload in Redis, ignoring cache errors"""
+    if redis_client is None:
+        return
+    try:
+        redis_client.setex(key, ttl, json.dumps(payload))
+    except Exception:
+        pass
+
+def invalidate_cache(*keys: str):
+    """Drop cached entries so the next request rebuilds them"""
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(*keys)
+    except Exception:
+        pass
+
+def get_cached_holding_totals() -> Optional[Tuple[Dict[int, float], Dict[int, float]]]:
+    """Read per-holding current values and costs from Redis, or None if they need recomputing"""
+    if redis_client is None:
+        return None
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hgetall(HOLDING_VALUES_KEY)
+        pipe.hgetall(HOLDING_COSTS_KEY)
+        values, costs = pipe.execute()
+        if not costs or values.keys() != costs.keys():
+            return None
+        return (
+            {int(holding_id): float(value) for holding_id, value in values.items()},
+            {int(holding_id): float(cost) for holding_id, cost in costs.items()}
+        )
+    except Exception:
+        return None
+
+def get_holding_totals_generation() -> Optional[int]:
+    """Read the counter bumped whenever holdings change, or None if Redis is unavailable.
+    Read it before loading holdings and hand it to cache_holding_totals."""
+    if redis_client is None:
+        return None
+    try:
+        return int(redis_client.get(HOLDING_TOTALS_GENERATION_KEY) or 0)
+    except Exception:
+        return None
+
+def cache_holding_totals(values: Dict[int, float], costs: Dict[int, float], generation: Optional[int]):
+    """Replace the cached per-holding values and costs; they expire along with prices.
+    Skipped if holdings changed since `generation` was read, so stale totals are never written back."""
+    if redis_client is None or generation is None:
+        return
+    try:
+        ttl = price_cache_ttl()
+        with redis_client.pipeline() as pipe:
+            pipe.watch(HOLDING_TOTALS_GENERATION_KEY)
+            if int(pipe.get(HOLDING_TOTALS_GENERATION_KEY) or 0) != generation:
+                return
+            pipe.multi()
+            pipe.delete(HOLDING_VALUES_KEY, HOLDING_COSTS_KEY)
+            # A zero value means a failed price fetch; leave the totals uncached like the price
+            if costs and all(values.values()):
+                pipe.hset(HOLDING_VALUES_KEY, mapping=values)
+                pipe.hset(HOLDING_COSTS_KEY, mapping=costs)
+                pipe.expire(HOLDING_VALUES_KEY, ttl)
+                pipe.expire(HOLDING_COSTS_KEY, ttl)
+            # Raises WatchError, and writes nothing, if holdings changed meanwhile
+            pipe.execute()
+    except Exception:
+        pass
+
+def invalidate_holding_totals():
+    """Drop the cached totals and bump the generation so in-flight rebuilds discard theirs"""
+    if redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(HOLDING_TOTALS_GENERATION_KEY)
+        pipe.delete(HOLDING_VALUES_KEY, HOLDING_COSTS_KEY)
+        pipe.execute()
+    except Exception:
+        pass
+
 async def update_price_snapshots():
     """Daily job to update price snapshots"""
-    db = SessionLocal()
     try:
-        holdings = db.query(Holding).all()
+        totals_generation = await asyncio.to_thread(get_holding_totals_generation)
+        
+        # Read holdings in a short session so no connection is held during price fetches
+        async with SessionLocal() as db:
+            holdings = (await db.execute(select(
+                Holding.id,
+                Holding.ticker,
+                Holding.shares,
+                Holding.purchase_price
+            ))).all()
+            
+            # Most recent snapshot price per holding, in one grouped query
+            latest = select(
+                PriceSnapshot.holding_id,
+                func.max(PriceSnapshot.date).label("date")
+            ).group_by(PriceSnapshot.holding_id).subquery()
+            last_prices = dict((await db.execute(
+                select(PriceSnapshot.holding_id, PriceSnapshot.price).join(
+                    latest,
+                    and_(
+                        PriceSnapshot.holding_id == latest.c.holding_id,
+                        PriceSnapshot.date == latest.c.date
+                    )
+                )
+            )).all())
+        
+        # yfinance and Redis calls block, so keep them off the event loop
+        prices = await asyncio.to_thread(get_current_prices, [holding.ticker for holding in holdings])
+        now = datetime.utcnow()
         portfolio_value = 0
         portfolio_invested = 0
+        snapshots = []
+        holding_values = {}
+        holding_costs = {}
         
         for holding in holdings:
-            current_price = get_current_price(holding.ticker)
+            current_price = prices[holding.ticker]
             
-            # Create price snapshot
-            snapshot = PriceSnapshot(
-                holding_id=holding.id,
-                price=current_price,
-                date=datetime.utcnow()
-            )
-            db.add(snapshot)
+            # Collect price snapshot rows for a single batched insert, skipping unchanged prices
+            last_price = last_prices.get(holding.id)
+            if last_price is None or abs(last_price - current_price) > SNAPSHOT_PRICE_TOLERANCE:
+                snapshots.append({
+                    "holding_id": holding.id,
+                    "price": current_price,
+                    "date": now
+                })
             
             # Calculate portfolio totals
-            portfolio_value += current_price * holding.shares
-            portfolio_invested += holding.purchase_price * holding.shares
+            holding_values[holding.id] = current_price * holding.shares
+            holding_costs[holding.id] = holding.purchase_price * holding.shares
+            portfolio_value += holding_values[holding.id]
+            portfolio_invested += holding_costs[holding.id]
         
-        # Create portfolio history entry
-        history = PortfolioHistory(
-            date=datetime.utcnow(),
-            total_value=portfolio_value,
-            total_invested=portfolio_invested,
-            profit_loss=portfolio_value - portfolio_invested
-        )
-        db.add(history)
-        db.commit()
+        # Write everything in one short transaction
+        async with SessionLocal() as db:
+            if snapshots:
+                await db.execute(PriceSnapshot.__table__.insert(), snapshots)
+            
+            # Create portfolio history entry
+            history = PortfolioHistory(
+                date=now,
+                total_value=portfolio_value,
+                total_invested=portfolio_invested,
+                profit_loss=portfolio_value - portfolio_invested
+            )
+            db.add(history)
+            await db.commit()
+        
+        await asyncio.to_thread(invalidate_cache, PORTFOLIO_HISTORY_CACHE_KEY)
+        await asyncio.to_thread(cache_holding_totals, holding_values, holding_costs, totals_generation)
         
     except Exception as e:
         print(f"Error updating snapshots: {e}")
-    finally:
-        db.close()
 
 # Schedule daily snapshots
 scheduler = AsyncIOScheduler()
@@ -167,12 +533,21 @@ def read_root():
     return {"message": "ClearTrack API is running"}
 
 @app.get("/api/holdings", response_model=List[HoldingResponse])
-def get_holdings(db: Session = Depends(get_db)):
-    holdings = db.query(Holding).all()
+async def get_holdings():
+    db = ScopedSession()
+    # Plain rows rather than ORM objects; nothing here is modified
+    holdings = (await db.execute(select(
+        Holding.id,
+        Holding.ticker,
+        Holding.shares,
+        Holding.purchase_price,
+        Holding.created_at
+    ))).all()
+    prices = await asyncio.to_thread(get_current_prices, [holding.ticker for holding in holdings])
     response = []
     
     for holding in holdings:
-        current_price = get_current_price(holding.ticker)
+        current_price = prices[holding.ticker]
         response.append(HoldingResponse(
             id=holding.id,
             ticker=holding.ticker,
@@ -187,16 +562,18 @@ def get_holdings(db: Session = Depends(get_db)):
     return response
 
 @app.post("/api/holdings", response_model=HoldingResponse)
-def create_holding(holding: HoldingCreate, db: Session = Depends(get_db)):
-    # Verify ticker exists
-    current_price = get_current_price(holding.ticker)
+async def create_holding(holding: HoldingCreate):
+    db = ScopedSession()
+    # Verify ticker exists; a priced ticker is cached, so repeat symbols skip Yahoo
+    current_price = await asyncio.to_thread(get_current_price, holding.ticker)
     if current_price == 0:
         raise HTTPException(status_code=400, detail="Invalid ticker symbol")
     
     db_holding = Holding(**holding.dict())
     db.add(db_holding)
-    db.commit()
-    db.refresh(db_holding)
+    await db.commit()
+    await db.refresh(db_holding)
+    await asyncio.to_thread(invalidate_holding_totals)
     
     return HoldingResponse(
         id=db_holding.id,
@@ -210,26 +587,47 @@ def create_holding(holding: HoldingCreate, db: Session = Depends(get_db)):
     )
 
 @app.delete("/api/holdings/{holding_id}")
-def delete_holding(holding_id: int, db: Session = Depends(get_db)):
-    holding = db.query(Holding).filter(Holding.id == holding_id).first()
+async def delete_holding(holding_id: int):
+    db = ScopedSession()
+    # Deleting a holding detaches its snapshots, so load them up front
+    holding = (await db.execute(
+        select(Holding).options(
+            selectinload(Holding.snapshots)
+        ).where(Holding.id == holding_id)
+    )).scalars().first()
     if not holding:
         raise HTTPException(status_code=404, detail="Holding not found")
     
-    db.delete(holding)
-    db.commit()
+    await db.delete(holding)
+    await db.commit()
+    await asyncio.to_thread(invalidate_holding_totals)
     return {"message": "Holding deleted"}
 
 @app.get("/api/portfolio/summary", response_model=PortfolioSummary)
-def get_portfolio_summary(db: Session = Depends(get_db)):
-    holdings = db.query(Holding).all()
+async def get_portfolio_summary():
+    db = ScopedSession()
+    cached = await asyncio.to_thread(get_cached_holding_totals)
+    if cached is not None:
+        holding_values, holding_costs = cached
+    else:
+        totals_generation = await asyncio.to_thread(get_holding_totals_generation)
+        # Only the columns needed here, with cost computed by the database
+        holdings = (await db.execute(select(
+            Holding.id,
+            Holding.ticker,
+            Holding.shares,
+            (Holding.shares * Holding.purchase_price).label("total_cost")
+        ))).all()
+        prices = await asyncio.to_thread(get_current_prices, [holding.ticker for holding in holdings])
+        holding_values = {
+            holding.id: prices[holding.ticker] * holding.shares
+            for holding in holdings
+        }
+        holding_costs = {holding.id: holding.total_cost for holding in holdings}
+        await asyncio.to_thread(cache_holding_totals, holding_values, holding_costs, totals_generation)
     
-    total_invested = 0
-    current_value = 0
-    
-    for holding in holdings:
-        current_price = get_current_price(holding.ticker)
-        total_invested += holding.purchase_price * holding.shares
-        current_value += current_price * holding.shares
+    total_invested = sum(holding_costs.values())
+    current_value = sum(holding_values.values())
     
     profit_loss = current_value - total_invested
     profit_loss_percent = (profit_loss / total_invested * 100) if total_invested > 0 else 0
@@ -237,30 +635,40 @@ def get_portfolio_summary(db: Session = Depends(get_db)):
     return PortfolioSummary(
         total_invested=total_invested,
         current_value=current_value,
-        holdings_count=len(holdings),
+        holdings_count=len(holding_costs),
         profit_loss=profit_loss,
         profit_loss_percent=profit_loss_percent
     )
 
 @app.get("/api/portfolio/history", response_model=List[PortfolioHistoryResponse])
-def get_portfolio_history(db: Session = Depends(get_db)):
+async def get_portfolio_history():
+    db = ScopedSession()
+    # History only changes when the daily snapshot runs, which invalidates this entry
+    cached = await asyncio.to_thread(get_cached_json, PORTFOLIO_HISTORY_CACHE_KEY)
+    if cached is not None:
+        return cached
+    
     # Get last 30 days of history
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    history = db.query(PortfolioHistory).filter(
-        PortfolioHistory.date >= thirty_days_ago
-    ).order_by(PortfolioHistory.date).all()
+    history = (await db.execute(
+        select(PortfolioHistory).where(
+            PortfolioHistory.date >= thirty_days_ago
+        ).order_by(PortfolioHistory.date)
+    )).scalars().all()
     
-    return [
-        PortfolioHistoryResponse(
-            date=entry.date.strftime("%Y-%m-%d"),
-            profit_loss=entry.profit_loss
-        )
+    response = [
+        {
+            "date": entry.date.strftime("%Y-%m-%d"),
+            "profit_loss": entry.profit_loss
+        }
         for entry in history
     ]
+    await asyncio.to_thread(cache_json, PORTFOLIO_HISTORY_CACHE_KEY, response, PORTFOLIO_HISTORY_CACHE_TTL)
+    return response
 
 @app.get("/api/prices/current/{ticker}")
-def get_current_stock_price(ticker: str):
-    price = get_current_price(ticker.upper())
+async def get_current_stock_price(ticker: str):
+    price = await asyncio.to_thread(get_current_price, ticker.upper())
     if price == 0:
         raise HTTPException(status_code=404, detail="Ticker not found")
     